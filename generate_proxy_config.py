@@ -5,11 +5,23 @@ import os
 import re
 import sys
 import stat
+import shutil
+import urllib.error
 import urllib.request
 import yaml 
 
+try:
+    from yaml import CSafeDumper as Dumper
+except ImportError:
+    from yaml import SafeDumper as Dumper
+
 from typing import List, Dict, Tuple
 
+CREDS_RE = re.compile(r'Proxy (login|password):\s*(\S+)')
+
+# Parallel (regions, hosts, ips, ports) columns, one entry per server.
+Servers = Tuple[List[str], List[str], List[str], List[int]]
+
 class ProxyConfigGenerator:
     def __init__(self):
 
@@ -17,16 +29,38 @@ class ProxyConfigGenerator:
          
         self.binary_name = "opera-proxy"
         self.base_url = f"https://github.com/dinger114/opera-proxy/releases/download/master/opera-proxy.linux-amd64"
+        self.version_file = f"{self.binary_name}.version"
         
         self.region_map = {'AM': 'Americas', 'AS': 'Asia', 'EU': 'Europe'}
 
     def download_tool(self):
         print(f"::group::Download Tool")
         try:
+            req = urllib.request.Request(self.base_url, headers=self.cached_validator())
+            try:
+                r = urllib.request.urlopen(req)
+            except urllib.error.HTTPError as e:
+                if e.code != 304: raise
+                e.close()
+                print(f"{self.binary_name} is up to date, skipping download.")
+                return
             print(f"Downloading {self.binary_name}...")
-            urllib.request.urlretrieve(self.base_url, self.binary_name)
+            try:
+                os.remove(self.version_file)
+            except FileNotFoundError:
+                pass
+            with r, open(self.binary_name, 'wb') as f:
+                shutil.copyfileobj(r, f, length=1 << 20)
+            size = os.path.getsize(self.binary_name)
+            length = r.headers.get('Content-Length', '')
+            if length.isdecimal() and int(length) != size:
+                raise OSError(f"incomplete download ({size} of {length} bytes)")
             st = os.stat(self.binary_name)
             os.chmod(self.binary_name, st.st_mode | stat.S_IEXEC)
+            header, value = self.remote_validator(r.headers)
+            if value:
+                with open(self.version_file, 'w') as f:
+                    f.write(f"{header}\n{value}\n{size}\n")
             print("Done.")
         except Exception as e:
             print(f"::error::Download failed: {e}")
@@ -34,59 +68,85 @@ class ProxyConfigGenerator:
         finally:
             print("::endgroup::")
 
+    @staticmethod
+    def remote_validator(headers) -> Tuple[str, str]:
+        if headers.get('ETag'): return 'If-None-Match', headers['ETag']
+        if headers.get('Last-Modified'): return 'If-Modified-Since', headers['Last-Modified']
+        return '', ''
+
+    def cached_validator(self) -> Dict[str, str]:
+        try:
+            with open(self.version_file, 'r') as f:
+                header, value, size = f.read().splitlines()
+            if header and value and int(size) == os.path.getsize(self.binary_name):
+                return {header: value}
+        except (OSError, ValueError):
+            pass
+        return {}
+
     def fetch_proxies(self) -> Dict[str, str]:
         print(f"::group::Fetch Proxies")
         files = {}
-        for region in self.region_map.keys():
-            outfile = f"{region}_raw.txt"
-            cmd = [f'./{self.binary_name}', '-country', region, '-list-proxies']
-            try:
+        procs = []
+        try:
+            for region in self.region_map.keys():
+                outfile = f"{region}_raw.txt"
+                cmd = [f'./{self.binary_name}', '-country', region, '-list-proxies']
                 with open(outfile, 'w') as f:
-                    subprocess.run(cmd, stdout=f, stderr=subprocess.PIPE, check=True, text=True)
-                files[region] = outfile
-                print(f"[{region}] OK.")
-            except subprocess.CalledProcessError as e:
-                print(f"::warning::[{region}] Failed: {e.stderr}")
+                    p = subprocess.Popen(cmd, stdout=f, stderr=subprocess.PIPE, text=True)
+                procs.append((region, outfile, p))
+
+            for region, outfile, p in procs:
+                _, err = p.communicate()
+                if p.returncode == 0:
+                    files[region] = outfile
+                    print(f"[{region}] OK.")
+                else:
+                    print(f"::warning::[{region}] Failed: {err}")
+        finally:
+            for _, _, p in procs:
+                if p.poll() is None:
+                    p.kill()
+                    p.communicate()
         print("::endgroup::")
         return files
 
-    def parse_data(self, files: Dict[str, str]) -> Tuple[str, str, List[Dict]]:
+    def parse_data(self, files: Dict[str, str]) -> Tuple[str, str, Servers]:
         login, password = "", ""
-        servers = []
+        regions, hosts, ips, ports = [], [], [], []
         
         for region, fpath in files.items():
             if not os.path.exists(fpath): continue
             try:
                 with open(fpath, 'r') as f:
-                    content = f.read()
-                
-                if not login:
-                    m_log = re.search(r'Proxy login:\s*(\S+)', content)
-                    m_pass = re.search(r'Proxy password:\s*(\S+)', content)
-                    if m_log: login = m_log.group(1)
-                    if m_pass: password = m_pass.group(1)
-                
-                for line in content.splitlines():
-                    line = line.strip()
-                    if re.match(r'^[^,]+,[^,]+,\d+$', line):
-                        host, ip, port = line.split(',')
-                        servers.append({
-                            'region': region,
-                            'host': host.strip(),
-                            'ip': ip.strip(),
-                            'port': int(port.strip())
-                        })
+                    creds = {}
+                    for line in f:
+                        if not login:
+                            m = CREDS_RE.match(line)
+                            if m:
+                                creds[m.group(1)] = m.group(2)
+                                if len(creds) == 2:
+                                    login, password = creds['login'], creds['password']
+                                continue
+                        parts = line.rstrip().split(',')
+                        if len(parts) == 3 and parts[0] and parts[1] and parts[2].isdecimal():
+                            port = int(parts[2])
+                            regions.append(region)
+                            hosts.append(parts[0])
+                            ips.append(parts[1])
+                            ports.append(port)
             except Exception:
                 pass 
                 
-        return login, password, servers
+        return login, password, (regions, hosts, ips, ports)
 
     def generate_yaml(self, login, password, servers):
-        if not servers:
+        regions, hosts, ips, ports = servers
+        if not regions:
             print("::error::No servers found!")
             sys.exit(1)
             
-        print(f"Generating minimal config for {len(servers)} proxies...")
+        print(f"Generating minimal config for {len(regions)} proxies...")
         
         proxies = []
         
@@ -97,36 +157,41 @@ class ProxyConfigGenerator:
         }
         
         counts = {k: 1 for k in display_map.keys()}
+        name_prefixes = {k: v + '-' for k, v in display_map.items()}
         
-        for s in servers:
-            region = s['region']
-            
-            prefix = display_map.get(region, region)
+        auth = {
+            'username': login,
+            'password': password,
+            'tls': True,
+            'skip-cert-verify': True
+        }
+        
+        for region, host, ip, port in zip(regions, hosts, ips, ports):
+            prefix = name_prefixes.get(region)
+            if prefix is None:
+                prefix = name_prefixes[region] = region + '-'
             
             current_count = counts.get(region, 1)
             
-            name = f"{prefix}-{current_count:02d}"
+            name = prefix + str(current_count).zfill(2)
             
             counts[region] = current_count + 1
             
             proxies.append({
                 'name': name,
                 'type': 'http',
-                'server': s['ip'],
-                'port': s['port'],
-                'username': login,
-                'password': password,
-                'tls': True,
-                'skip-cert-verify': True,
-                'sni': s['host']
+                'server': ip,
+                'port': port,
+                **auth,
+                'sni': host
             })
 
         config = {'proxies': proxies}
         
         with open(self.output_filename, 'w', encoding='utf-8') as f:
-            yaml.dump(config, f, allow_unicode=True, sort_keys=False)
+            yaml.dump(config, f, Dumper=Dumper, allow_unicode=True, sort_keys=False)
         
-        print(f"::notice::Generated {self.output_filename} ({len(servers)} nodes).")
+        print(f"::notice::Generated {self.output_filename} ({len(regions)} nodes).")
 
     def run(self):
         self.download_tool()
@@ -141,7 +206,10 @@ class ProxyConfigGenerator:
         self.generate_yaml(login, pwd, servers)
         
         for f in files.values():
-            if os.path.exists(f): os.remove(f)
+            try:
+                os.remove(f)
+            except FileNotFoundError:
+                pass
 
 if __name__ == "__main__":
     ProxyConfigGenerator().run()